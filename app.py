@@ -1,10 +1,19 @@
 import streamlit as st
+
+# Configure the page before any other import or Streamlit call, so the browser can render the app chrome right away
+st.set_page_config(page_title="Shaimind AI", layout="centered")
+
 from personality_manager import load_personality, PersonalityState # Import PersonalityState for type hinting clarity
-from emotion_manager import update_emotional_state, apply_decision_heuristics
+from emotion_manager import analyze_input
 import llm_handler # Renamed from main to llm_handler
+from messages import Msg, spill_history
 import os
+import copy
+import uuid
 import logging
-import openai # Import openai here for client initialization
+import asyncio
+import threading
+import time
 
 # Set up logging for Streamlit
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -19,29 +28,100 @@ except KeyError:
     st.error("OpenAI API key not found in Streamlit Secrets. Please add it to run this app.")
     st.stop() # Stop execution if API key is missing
 
-if "openai_client" not in st.session_state:
-    st.session_state.openai_client = openai.OpenAI(api_key=api_key)
+@st.cache_resource
+def _get_openai_client(api_key: str):
+    """Create the AsyncOpenAI client once per process; openai is imported lazily here rather than at startup."""
+    import openai
+    return openai.AsyncOpenAI(api_key=api_key)
+
+@st.cache_resource
+def get_event_loop():
+    """
+    Start one long-lived event loop in a background thread, shared by all sessions.
+    The AsyncOpenAI client keeps its connection pool bound to the loop it first ran on,
+    so coroutines are submitted here rather than to a fresh asyncio.run() loop on every rerun.
+    """
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="shaimind-event-loop", daemon=True).start()
+    return loop
+
+@st.cache_resource
+def get_response_cache():
+    """Exact-match response cache shared across reruns and sessions."""
+    return llm_handler.ResponseCache(maxsize=512)
+
+@st.cache_resource
+def get_semantic_cache():
+    """
+    Embedding-similarity response cache shared across reruns and sessions, seeded from disk if prewarmed.
+    semantic_cache (and numpy) is imported here, on the first model-backed message, rather than at startup.
+    """
+    from semantic_cache import SemanticCache, SEED_PATH
+    cache = SemanticCache()
+    if SEED_PATH.exists():
+        try:
+            cache.load(SEED_PATH)
+        except Exception as e: # A bad seed file only costs cache hits
+            logger.error(f"Could not load semantic cache seed {SEED_PATH}: {e}")
+    return cache
+
+# Minimum time between UI flushes while streaming, so Streamlit isn't redrawn for every single token
+STREAM_FLUSH_INTERVAL = 0.016 # seconds (~one frame)
+
+def stream_async(async_gen, flush_interval=STREAM_FLUSH_INTERVAL):
+    """
+    Drive an async generator on the shared event loop and re-yield its text synchronously,
+    batching deltas so st.write_stream flushes at most once per flush_interval.
+    """
+    loop = get_event_loop()
+    pending = []
+    last_flush = time.monotonic()
+    while True:
+        try:
+            delta = asyncio.run_coroutine_threadsafe(async_gen.__anext__(), loop).result()
+        except StopAsyncIteration:
+            break
+        pending.append(delta)
+        now = time.monotonic()
+        if now - last_flush >= flush_interval:
+            yield "".join(pending)
+            pending.clear()
+            last_flush = now
+    if pending:
+        yield "".join(pending)
 
 # ----------------------------------------------------
 # 2. Load Personalities
 # ----------------------------------------------------
 identities_folder = "identities"
-personalities = {}
 
-# Check if the identities folder exists before listing
-if os.path.exists(identities_folder):
-    for filename in os.listdir(identities_folder):
+@st.cache_resource
+def load_all_personalities(folder: str) -> dict[str, PersonalityState]:
+    """
+    Load every personality JSON file in `folder` once per process.
+    The returned objects are shared by all sessions, so they must not be mutated directly.
+    """
+    loaded = {}
+    for filename in os.listdir(folder):
         if filename.endswith(".json"):
             try:
                 personality_name = filename.replace(".json", "")
-                personalities[personality_name] = load_personality(os.path.join(identities_folder, filename))
+                loaded[personality_name] = load_personality(os.path.join(folder, filename))
             except Exception as e:
                 logger.error(f"Error loading personality {filename}: {e}")
                 st.warning(f"Could not load personality '{personality_name}'. Error: {e}")
-else:
+    return loaded
+
+# Check if the identities folder exists before listing
+if not os.path.exists(identities_folder):
     st.error(f"Personality identities folder '{identities_folder}' not found. Please ensure it's in your repository.")
     st.stop() # Stop if identities folder is missing
 
+# Emotion updates mutate PersonalityState, so each session works on its own copy of the cached base configs
+if "personalities" not in st.session_state:
+    st.session_state.personalities = copy.deepcopy(load_all_personalities(identities_folder))
+personalities = st.session_state.personalities
+
 if not personalities:
     st.error("No personality files found in the 'identities' folder. Please add some .json files (e.g., edgar_alan_poe.json).")
     st.stop()
@@ -52,8 +132,6 @@ logger.info(f"Loaded Personalities: {list(personalities.keys())}")
 # ----------------------------------------------------
 # 3. Streamlit UI Setup and Session State Management
 # ----------------------------------------------------
-st.set_page_config(page_title="Shaimind AI", layout="centered")
-
 st.title("🤖 ShaiMind - AI Personalities")
 st.subheader("Talk to historical figures like Edgar Allan Poe and Nikola Tesla.")
 
@@ -74,111 +152,188 @@ selected_persona_from_ui = st.selectbox(
 personality_state: PersonalityState = personalities[selected_persona_from_ui]
 
 
+def reset_conversation(personality_state):
+    """Start a fresh conversation seeded with the persona's system prompt, dropping any summary memory."""
+    st.session_state.conversation_history = [Msg("system", personality_state.system_prompt)]
+    st.session_state.history_summary = "" # Digest of turns older than the API history window
+    st.session_state.summarized_upto = 1 # history[1:summarized_upto] is covered by history_summary
+    st.session_state.summary_job = None # (future, target index) of an in-flight background summary
+    st.session_state.conversation_id = uuid.uuid4().hex # Names the on-disk file for messages spilled past the cap
+    st.session_state.spilled_count = 0
+
 # Logic to handle personality change: Reset conversation history
 if selected_persona_from_ui != st.session_state.selected_persona:
     st.session_state.selected_persona = selected_persona_from_ui
     # Reset conversation history with the new personality's system prompt
-    st.session_state.conversation_history = [{"role": "system", "content": personality_state.system_prompt}]
+    reset_conversation(personality_state)
     st.session_state.last_response = ""
     st.rerun() # Rerun to apply the change and refresh the UI state
 
 # Initialize conversation history for the current persona if not already set
 # This ensures it's set correctly on first load or after a persona change
-if "conversation_history" not in st.session_state or st.session_state.conversation_history[0].get("content") != personality_state.system_prompt:
-    st.session_state.conversation_history = [{"role": "system", "content": personality_state.system_prompt}]
+if "conversation_history" not in st.session_state or st.session_state.conversation_history[0].content != personality_state.system_prompt:
+    reset_conversation(personality_state)
 
 # ----------------------------------------------------
 # 4. Display Persona Information
 # ----------------------------------------------------
 st.markdown(f"**Talking to:** {personality_state.name}")
 st.write(f"🧠 Traits: {personality_state.traits}")
-st.write(f"💭 Current Mood: {personality_state.emotional_state} (Intensity: {personality_state.emotional_intensity})")
 
 # ----------------------------------------------------
-# 5. Conversation History Display
+# Helpers used by the chat fragment below
 # ----------------------------------------------------
-st.subheader("📜 Conversation History")
-# Display messages in reverse for chat-like interface (newest at bottom)
-# Skip the very first system message as it's internal to the AI's setup
-for message in reversed(st.session_state.conversation_history[1:]): # Start from 1 to skip initial system prompt
-    if message["role"] == "user":
-        st.chat_message("user").write(message['content'])
-    elif message["role"] == "assistant":
-        st.chat_message("assistant").write(message['content'])
-    elif message["role"] == "system": # Optionally display internal system messages for debugging
-        # st.chat_message("system").write(f"_System: {message['content']}_")
-        pass # Don't display system messages
+# Function to clean response output
+def extract_final_response(raw_text):
+    """
+    Extract the final response from AI output. The request asks for plain text
+    (response_format and the system prompt rule out fences and prefixes), so only whitespace is trimmed.
+    """
+    return raw_text.strip()
 
-# ----------------------------------------------------
-# 6. User Input and Response Generation
-# ----------------------------------------------------
+def append_message(message: Msg):
+    """
+    Append a message to the conversation, moving the oldest messages to disk once the history
+    exceeds its cap, and shift the summary bookkeeping to match the shortened list.
+    """
+    history = st.session_state.conversation_history
+    history.append(message)
+    length_before = len(history)
+    try:
+        st.session_state.spilled_count = spill_history(
+            history, st.session_state.conversation_id, st.session_state.spilled_count
+        )
+    except OSError as e:
+        logger.error(f"Could not spill conversation history to disk: {e}")
+        return
+    removed = length_before - len(history)
+    if removed:
+        # Spilled messages are far older than the window, so they were already folded into the summary
+        st.session_state.summarized_upto = max(2, st.session_state.summarized_upto - removed)
+        if st.session_state.summary_job is not None:
+            future, target = st.session_state.summary_job
+            st.session_state.summary_job = (future, max(2, target - removed))
 
-# Function to clean response output - keeping this as it's useful
-def extract_final_response(raw_text):
+def apply_finished_summary():
+    """Adopt the background summary if it has finished; never waits on one still running."""
+    if st.session_state.summary_job is None or not st.session_state.summary_job[0].done():
+        return
+    future, target = st.session_state.summary_job
+    st.session_state.summary_job = None
+    try:
+        st.session_state.history_summary = future.result()
+        st.session_state.summarized_upto = target
+    except Exception as e:
+        logger.error(f"Background history summarization failed: {e}")
+
+def schedule_summary():
     """
-    Extract only the final response from AI output, removing internal thought processing
-    or markdown code block fences.
+    Once a full batch of SUMMARY_BATCH_MESSAGES turns has slid out of the API window, fold them into
+    the summary in one call on the background event loop, so the current reply is never delayed by it.
     """
-    cleaned_text = raw_text
-    
-    # Heuristic: Remove content before "USER MESSAGE:" if it slipped through
-    if "USER MESSAGE:" in cleaned_text:
-        cleaned_text = cleaned_text.split("USER MESSAGE:")[-1].strip()
+    if st.session_state.summary_job is not None:
+        return
+    history = st.session_state.conversation_history
+    target = len(history) - 2 * llm_handler.HISTORY_WINDOW_TURNS
+    if target - st.session_state.summarized_upto < llm_handler.SUMMARY_BATCH_MESSAGES:
+        return
+    future = asyncio.run_coroutine_threadsafe(
+        llm_handler.summarize_history(
+            _get_openai_client(api_key),
+            history[st.session_state.summarized_upto:target],
+            st.session_state.history_summary
+        ),
+        get_event_loop()
+    )
+    st.session_state.summary_job = (future, target)
 
-    # Heuristic: Remove content before "Respond as [Persona Name]," if it slipped through
-    if f"Respond as {personality_state.name}," in cleaned_text:
-         cleaned_text = cleaned_text.split(f"Respond as {personality_state.name},")[-1].strip()
-    
-    # Heuristic: Look for common start markers for AI response if a specific one isn't enforced
-    # (e.g., "AI response:", "RESPONSE:")
-    if "RESPONSE:" in cleaned_text:
-        cleaned_text = cleaned_text.split("RESPONSE:")[-1].strip()
-
-    # Remove markdown code block fences if they were added by the AI
-    if cleaned_text.startswith("```") and cleaned_text.endswith("```"):
-        cleaned_text = cleaned_text.removeprefix("```").removesuffix("```").strip()
-        # Also remove language specifier if present (e.g., "python\n", "json\n", "text\n")
-        lines = cleaned_text.split('\n')
-        if len(lines) > 1:
-            first_line_stripped = lines[0].strip().lower()
-            # Basic check for common markdown language specifiers
-            if len(first_line_stripped) < 20 and not ' ' in first_line_stripped and first_line_stripped.isalpha(): # Simple check if it looks like a language specifier
-                cleaned_text = "\n".join(lines[1:]).strip()
-    
-    return cleaned_text
+# Only the most recent messages are rendered on each rerun; older ones are built on demand
+VISIBLE_MESSAGES = 30
+
+def render_messages(messages):
+    """Render chat messages newest first, skipping internal system messages."""
+    for message in reversed(messages):
+        if message.role == "user":
+            st.chat_message("user").write(message.content)
+        elif message.role == "assistant":
+            st.chat_message("assistant").write(message.content)
+        elif message.role == "system": # Optionally display internal system messages for debugging
+            # st.chat_message("system").write(f"_System: {message.content}_")
+            pass # Don't display system messages
+
+# Sections 5 and 6 run inside a fragment: sending a message reruns only the chat,
+# not the persona loading, selector and instructions around it.
+@st.fragment
+def chat_fragment(personality_state: PersonalityState):
+    # Shown here rather than in section 4 so mood changes appear on fragment reruns
+    st.write(f"💭 Current Mood: {personality_state.emotional_state} (Intensity: {personality_state.emotional_intensity})")
+
+    # ----------------------------------------------------
+    # 5. Conversation History Display
+    # ----------------------------------------------------
+    st.subheader("📜 Conversation History")
+    # Display messages in reverse for chat-like interface (newest at bottom)
+    # Skip the very first system message as it's internal to the AI's setup
+    history = st.session_state.conversation_history
+    visible_start = max(1, len(history) - VISIBLE_MESSAGES) # Never below 1, to skip the initial system prompt
+
+    # The list is newest-first, so the message being sent and its streamed reply go above it,
+    # where they will sit after the rerun: reply on top, then the user's message
+    live_messages = st.container()
+    live_reply = live_messages.container()
+    render_messages(history[visible_start:])
+
+    # Older messages are only turned into widgets when the user asks for them
+    earlier_count = visible_start - 1
+    if earlier_count and st.toggle(f"Load {earlier_count} earlier messages", key="show_earlier_messages"):
+        render_messages(history[1:visible_start])
 
-# Text input for user messages (using st.chat_input for better mobile experience)
-user_input = st.chat_input("Type your message here...", key="chat_input")
+    # ----------------------------------------------------
+    # 6. User Input and Response Generation
+    # ----------------------------------------------------
+    # Text input for user messages (using st.chat_input for better mobile experience)
+    user_input = st.chat_input("Type your message here...", key="chat_input")
 
-if user_input:
-    # Add user message to history immediately for display
-    st.session_state.conversation_history.append({"role": "user", "content": user_input})
+    if user_input:
+        # Add user message to history immediately for display
+        append_message(Msg("user", user_input))
 
-    with st.spinner("ShaiMind is thinking..."):
-        # Process emotion & decision heuristics
-        heuristic_response = apply_decision_heuristics(personality_state, user_input)
+        live_messages.chat_message("user").write(user_input)
+
+        # Lowercase once and share it with every keyword scan below
+        user_lower = user_input.lower()
+
+        # Process decision heuristics and emotion triggers in one pass; emotion is only updated when no heuristic fires
+        heuristic_response, _ = analyze_input(personality_state, user_input, user_lower)
         if heuristic_response:
             response_text = heuristic_response
         else:
-            # Update emotion before generating response
-            update_emotional_state(personality_state, user_input)
-            
-            # Pass the OpenAI client to the generate_persona_response function
-            response_text = llm_handler.generate_persona_response(
-                st.session_state.openai_client, # Pass the client
+            apply_finished_summary() # Pick up the summary scheduled after the previous turn, if it has landed
+
+            # Stream the reply into the chat as tokens arrive instead of waiting behind a spinner
+            response_stream = llm_handler.generate_persona_response(
+                _get_openai_client(api_key), # Pass the client
                 personality_state,
                 user_input,
-                st.session_state.conversation_history # Pass current history for context
+                st.session_state.conversation_history, # Pass current history for context
+                response_cache=get_response_cache(),
+                semantic_cache=get_semantic_cache(),
+                cacheable=True, # Repeated or paraphrased messages in the same context replay the stored reply
+                summary=st.session_state.history_summary,
+                summarized_upto=st.session_state.summarized_upto
             )
-            response_text = extract_final_response(response_text) # Clean response after generation
-
+            response_text = live_reply.chat_message("assistant").write_stream(stream_async(response_stream))
+            response_text = extract_final_response(response_text) # Clean response once the stream has completed
 
         # Store AI response in history
-        st.session_state.conversation_history.append({"role": "assistant", "content": response_text})
+        append_message(Msg("assistant", response_text))
         st.session_state.last_response = response_text
+        schedule_summary()
     
-    # Rerun the app to update the conversation history display immediately
-    st.rerun()
+        # Rerun only the chat fragment to update the conversation history display immediately
+        st.rerun(scope="fragment")
+
+chat_fragment(personality_state)
 
 # ----------------------------------------------------
 # 7. Instructions
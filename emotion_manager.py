@@ -1,40 +1,79 @@
 import re
+from typing import Optional
 
-def update_emotional_state(personality_state, user_input):
+# Emotion triggers: keyword -> (new emotion, intensity change)
+_TRIGGER_MAP = {
+    "death": ("melancholy", 2),
+    "love": ("nostalgic", 1),
+    "fear": ("anxious", 1),
+    "hope": ("reflective", -1),
+    "raven": ("curious", 1),
+    "mortality": ("introspective", 2)
+}
+
+# All triggers fused into one precompiled alternation so each message is scanned once.
+# Heuristic keywords are a subset of the emotion triggers, so the same regex serves both.
+_TRIGGER_RE = re.compile(r"\b(" + "|".join(_TRIGGER_MAP) + r")\b")
+
+# Canned replies: keyword -> response builder taking the personality state
+_HEURISTICS = {
+    "death": lambda personality_state: f"Ah, death! The eternal muse of my musings. {personality_state.name} cannot help but dwell upon its mystery.",
+    "love": lambda personality_state: f"Love, that bittersweet elixir, fills my heart with both longing and sorrow.",
+    "raven": lambda personality_state: f"The raven, ever watchful, remains a steadfast symbol of my contemplations."
+}
+
+def _apply_emotion(personality_state, trigger):
+    """Set the emotion for `trigger` and shift intensity, clamped to 0-10. Returns the (emotion, change) applied."""
+    new_emotion, intensity_change = _TRIGGER_MAP[trigger]
+    personality_state.emotional_state = new_emotion
+    personality_state.emotional_intensity = max(
+        0, min(personality_state.emotional_intensity + intensity_change, 10)
+    )
+    return new_emotion, intensity_change
+
+def update_emotional_state(personality_state, user_input, user_lower=None):
     """
     Adjust emotional state based on user input and intensity of triggers.
+    Pass `user_lower` (the already-lowercased input) to avoid lowercasing it again.
     """
-    triggers = {
-        r"\bdeath\b": ("melancholy", 2),
-        r"\blove\b": ("nostalgic", 1),
-        r"\bfear\b": ("anxious", 1),
-        r"\bhope\b": ("reflective", -1),
-        r"\braven\b": ("curious", 1),
-        r"\bmortality\b": ("introspective", 2)
-    }
-
-    input_lower = user_input.lower()
-    for pattern, (new_emotion, intensity_change) in triggers.items():
-        if re.search(pattern, input_lower):
-            personality_state.emotional_state = new_emotion
-            personality_state.emotional_intensity = max(
-                0, min(personality_state.emotional_intensity + intensity_change, 10)
-            )
-            break  # Only trigger one emotion change per message.
-
-def apply_decision_heuristics(personality_state, user_input):
+    if user_lower is None:
+        user_lower = user_input.lower()
+    match = _TRIGGER_RE.search(user_lower)
+    if match:  # Only the first trigger in the message changes the emotion.
+        _apply_emotion(personality_state, match.group(1))
+
+def apply_decision_heuristics(personality_state, user_input, user_lower=None):
     """
     Apply rules based on the personality's traits, anchors, and known behaviors.
+    Pass `user_lower` (the already-lowercased input) to avoid lowercasing it again.
     """
-    heuristics = {
-        "death": lambda: f"Ah, death! The eternal muse of my musings. {personality_state.name} cannot help but dwell upon its mystery.",
-        "love": lambda: f"Love, that bittersweet elixir, fills my heart with both longing and sorrow.",
-        "raven": lambda: f"The raven, ever watchful, remains a steadfast symbol of my contemplations."
-    }
-
-    for trigger, response_fn in heuristics.items():
-        if trigger in user_input.lower():
-            return response_fn()
+    if user_lower is None:
+        user_lower = user_input.lower()
+    for match in _TRIGGER_RE.finditer(user_lower):
+        if match.group(1) in _HEURISTICS:
+            return _HEURISTICS[match.group(1)](personality_state)
 
     # Default: no specific heuristic triggered.
     return None
+
+def analyze_input(personality_state, user_input, user_lower=None) -> tuple[Optional[str], Optional[tuple]]:
+    """
+    Run decision heuristics and emotion triggers in a single pass over the lowercased input
+    (`user_lower` if the caller already computed it).
+    Returns (heuristic_response, emotion_update). If a heuristic fires its canned reply is
+    returned and the emotion is left untouched; otherwise the first emotion trigger in the
+    message is applied and returned as (new_emotion, intensity_change), or None if there was none.
+    """
+    if user_lower is None:
+        user_lower = user_input.lower()
+    first_trigger = None
+    for match in _TRIGGER_RE.finditer(user_lower):
+        trigger = match.group(1)
+        if trigger in _HEURISTICS:
+            return _HEURISTICS[trigger](personality_state), None
+        if first_trigger is None:
+            first_trigger = trigger
+
+    if first_trigger is None:
+        return None, None
+    return None, _apply_emotion(personality_state, first_trigger)
@@ -1,60 +1,240 @@
-import openai
 import logging
+import re
+import threading
+from collections import OrderedDict
+from messages import Msg, to_openai_messages
 
 logger = logging.getLogger(__name__)
 
-def generate_persona_response(openai_client, personality_state, user_input, conversation_history):
+# Number of trailing conversation messages that form part of a response-cache key
+CACHE_HISTORY_TAIL = 6
+
+# The semantic cache is shared across sessions and only compares the query and the last assistant turn,
+# so it is used only while those are the whole context sent: no summary and at most this many messages
+SEMANTIC_CACHE_MAX_HISTORY = 3
+
+# Number of most recent user/assistant message pairs sent to the model alongside the system prompt
+HISTORY_WINDOW_TURNS = 8
+
+# Model routing: short, simple turns go to the light model, everything else to the default one
+DEFAULT_MODEL = "gpt-4o" # Using gpt-4o as it's generally better and more cost-effective for conversational tasks
+LIGHT_MODEL = "gpt-4o-mini"
+SHORT_INPUT_LENGTH = 40 # Messages shorter than this (in characters) count as short
+_COMPLEX_INPUT_RE = re.compile(
+    r"```|\b(code|program|function|algorithm|debug|analy[sz]e|analysis|compare|explain|why|calculate|prove|derive|design)\b",
+    re.IGNORECASE
+)
+
+# Turns that slide out of the window are folded into the summary in batches of this many messages,
+# one summary call per batch; until then they stay in the window, so it reaches back at most this far extra
+SUMMARY_BATCH_MESSAGES = 2 * HISTORY_WINDOW_TURNS
+SUMMARY_MODEL = "gpt-4o-mini" # Cheap model is enough for condensing old turns
+SUMMARY_MAX_TOKENS = 200
+
+class ResponseCache:
+    """
+    Thread-safe LRU of completed persona responses, keyed by make_cache_key().
+    A single instance can be shared by every Streamlit session.
+    """
+    def __init__(self, maxsize: int = 512):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached response for `key` (marking it most recently used), or None."""
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key, response: str):
+        """Store a response, evicting the least recently used entry once maxsize is exceeded."""
+        with self._lock:
+            self._entries[key] = response
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+def make_cache_key(personality_state, user_input, conversation_history):
+    """
+    Build an exact-match cache key from the persona, its current mood, the user's message
+    and the contents of the last CACHE_HISTORY_TAIL messages.
+    """
+    history_tail = tuple((message.role, message.content) for message in conversation_history[-CACHE_HISTORY_TAIL:])
+    return (
+        personality_state.name,
+        personality_state.system_prompt,
+        personality_state.emotional_state,
+        personality_state.emotional_intensity,
+        user_input,
+        history_tail
+    )
+
+def window_history(conversation_history, max_turns=HISTORY_WINDOW_TURNS, summary="", summarized_upto=1,
+                   max_lag=SUMMARY_BATCH_MESSAGES):
+    """
+    Return the persona's system prompt (first entry) plus only the last `max_turns` message pairs,
+    so prompt size stays bounded however long the session runs. The full history is left untouched.
+    `summarized_upto` is the index of the first message not covered by `summary`; the window is widened
+    back to it so no message falls between the summary and the window, but by no more than `max_lag`
+    messages, so the prompt stays bounded even if summaries stop landing.
+    If a summary is given, it is inserted as a system message after the prompt.
+    """
+    recent_start = len(conversation_history) - 2 * max_turns
+    window_start = max(1, recent_start - max_lag, min(recent_start, summarized_upto))
+    summary_message = []
+    if summary and window_start > 1:
+        summary_message = [Msg("system", f"Earlier conversation summary: {summary}")]
+    return conversation_history[:1] + summary_message + conversation_history[window_start:]
+
+async def summarize_history(openai_client, msgs, previous_summary=""):
+    """
+    Condense `msgs` (turns that have slid out of the window) into a short summary using SUMMARY_MODEL,
+    folding in `previous_summary` so older memory carries forward. Errors propagate to the caller.
+    """
+    transcript = "\n".join(f"{message.role}: {message.content}" for message in msgs)
+    if previous_summary:
+        transcript = f"Summary so far: {previous_summary}\n{transcript}"
+    response = await openai_client.chat.completions.create(
+        model=SUMMARY_MODEL,
+        messages=[
+            {"role": "system", "content": f"Summarize this conversation in at most {SUMMARY_MAX_TOKENS} tokens. "
+                                          "Keep names, facts, the user's questions and preferences, and any unresolved threads."},
+            {"role": "user", "content": transcript}
+        ],
+        temperature=0.3,
+        max_tokens=SUMMARY_MAX_TOKENS
+    )
+    return response.choices[0].message.content.strip()
+
+def route_model(user_input, conversation_history):
+    """
+    Choose the chat model for this turn. Short messages without code or analysis cues are served by
+    LIGHT_MODEL, unless they follow up on a previous user message that had such cues; all else uses DEFAULT_MODEL.
+    """
+    if len(user_input) >= SHORT_INPUT_LENGTH or _COMPLEX_INPUT_RE.search(user_input):
+        return DEFAULT_MODEL
+    # conversation_history ends with the current message, so look at the user turn before it
+    for message in reversed(conversation_history[:-1]):
+        if message.role == "user":
+            if _COMPLEX_INPUT_RE.search(message.content):
+                return DEFAULT_MODEL
+            break
+    return LIGHT_MODEL
+
+def _last_assistant_turn(conversation_history):
+    """Return the content of the most recent assistant message, or an empty string."""
+    for message in reversed(conversation_history):
+        if message.role == "assistant":
+            return message.content
+    return ""
+
+def build_chat_request(personality_state, user_input, conversation_history, temperature=0.8, summary="",
+                       summarized_upto=1):
+    """
+    Build the keyword arguments for chat.completions.create for one persona turn: routed model,
+    windowed history plus the current user prompt, and sampling settings. Shared by live generation
+    and offline batch jobs so both send identical requests.
+    """
+    # Persona fields are rendered at load time and the emotion only when it changes; only the message is substituted here
+    user_prompt = personality_state.emotion_user_prompt_template().format_map({"user_input": user_input})
+    
+    # conversation_history holds Msg objects; they are converted to OpenAI's list-of-dicts format only here.
+    # The system prompt from personality_state (which already includes the internal reasoning
+    # instructions) is the first entry in conversation_history, which is ideal for OpenAI.
+    # Only a sliding window of recent turns is sent after it.
+    
+    # Only the trailing user message varies per call, so the prompt prefix stays cacheable server-side.
+    messages = to_openai_messages(window_history(conversation_history, summary=summary, summarized_upto=summarized_upto)) + [
+        {"role": "user", "content": user_prompt}
+    ]
+
+    return {
+        "model": route_model(user_input, conversation_history), # Cheaper, faster model for short simple turns
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": 300,
+        "top_p": 0.95,
+        "frequency_penalty": 0.2,
+        "presence_penalty": 0.4,
+        "response_format": {"type": "text"} # Plain text; switch to a json_schema format if structured output is needed
+    }
+
+async def generate_persona_response(openai_client, personality_state, user_input, conversation_history,
+                                    temperature=0.8, response_cache=None, semantic_cache=None, cacheable=False,
+                                    summary="", summarized_upto=1):
     """
     Generate a response based on the personality's reasoning style, emotional state, and conversation history.
-    This function now takes the initialized openai_client directly.
+    This function takes an initialized openai.AsyncOpenAI client and is an async generator:
+    it yields text deltas as the model streams them (iterate with `async for`).
+
+    The optional ResponseCache (exact match) and SemanticCache (embedding similarity) are consulted,
+    in that order, only when `cacheable` is set or `temperature` is 0, since sampled responses are
+    otherwise expected to vary. The SemanticCache is further limited to the opening of a conversation
+    (see SEMANTIC_CACHE_MAX_HISTORY). A hit is yielded whole without calling the chat model.
+    `summary` is an optional digest of turns older than the history window (see summarize_history),
+    covering conversation_history[1:summarized_upto].
     """
+    # Imported on first use so loading this module (and the app) doesn't pull in openai or numpy
+    import openai
+    from semantic_cache import embed_query, mood_key
+
+    use_cache = cacheable or temperature == 0
+    use_response_cache = use_cache and response_cache is not None
+    if use_response_cache:
+        cache_key = make_cache_key(personality_state, user_input, conversation_history)
+        cached_response = response_cache.get(cache_key)
+        if cached_response is not None:
+            yield cached_response
+            return
+
+    embeddings = None
+    use_semantic_cache = (use_cache and semantic_cache is not None and not summary
+                          and len(conversation_history) <= SEMANTIC_CACHE_MAX_HISTORY)
+    if use_semantic_cache:
+        try:
+            embeddings = await embed_query(openai_client, user_input, _last_assistant_turn(conversation_history))
+        except Exception as e: # The cache is an optimisation; fall through to the model if embedding fails
+            logger.warning(f"Semantic cache embedding failed, skipping cache lookup: {e}")
+        if embeddings is not None:
+            cached_response = semantic_cache.lookup(mood_key(personality_state), *embeddings)
+            if cached_response is not None:
+                if use_response_cache:
+                    response_cache.put(cache_key, cached_response)
+                yield cached_response
+                return
+
     try:
-        internal_reasoning_prompt = f"""
-        INTERNAL THOUGHT PROCESS (not shown to user):
-        You are {personality_state.name}. Think as they would, step by step:
-        - Interpret the user's message.
-        - Reflect on your emotional state: {personality_state.emotional_state} (Intensity: {personality_state.emotional_intensity}).
-        - Incorporate these anchors: {', '.join(personality_state.anchors)}.
-        - Consider your reasoning style: {personality_state.reasoning_style}.
-        - Formulate a brief, persona-appropriate response.
-        - Your final output should be ONLY the persona's response, without internal thoughts or extra text.
-        """
-        user_prompt = f"""
-        USER MESSAGE: {user_input}
-        Respond as {personality_state.name}, considering your thought process and reasoning style.
-        """
-        
-        # Ensure conversation_history is correctly formatted as list of dicts.
-        # The system prompt from personality_state is already the first entry in conversation_history,
-        # which is ideal for OpenAI.
-        
-        # Add the internal reasoning as a system message right before the user's current message.
-        # This keeps the instruction separate from the chat history.
-        messages = conversation_history + [
-            {"role": "system", "content": internal_reasoning_prompt},
-            {"role": "user", "content": user_prompt}
-        ]
-
-        response = openai_client.chat.completions.create( # UPDATED SYNTAX
-            model="gpt-4o", # Using gpt-4o as it's generally better and more cost-effective for conversational tasks
-            messages=messages,
-            temperature=0.8,
-            max_tokens=300,
-            top_p=0.95,
-            frequency_penalty=0.2,
-            presence_penalty=0.4
+        stream = await openai_client.chat.completions.create( # Non-blocking: awaits the AsyncOpenAI client
+            **build_chat_request(personality_state, user_input, conversation_history, temperature,
+                                 summary, summarized_upto),
+            stream=True # Yield tokens as they are generated to cut time-to-first-token
         )
-        return response.choices[0].message.content.strip() # UPDATED ACCESS AND STRIP
+        response_parts = []
+        async for chunk in stream:
+            if chunk.choices:
+                delta = chunk.choices[0].delta.content or ""
+                response_parts.append(delta)
+                yield delta
+
+        # Only completed, successful generations are cached; API errors below are not
+        response_text = "".join(response_parts)
+        if use_response_cache:
+            response_cache.put(cache_key, response_text)
+        if embeddings is not None:
+            semantic_cache.add(mood_key(personality_state), *embeddings, response_text)
     except openai.APIStatusError as e: # UPDATED ERROR HANDLING to catch v1.x.x errors
         logger.error(f"OpenAI API error in generate_persona_response: {e}")
         if e.status_code == 401:
-            return "I'm sorry, but my connection to the mind-stream is reporting an invalid access key. Please ensure my operator has set up the OpenAI API key correctly."
+            yield "I'm sorry, but my connection to the mind-stream is reporting an invalid access key. Please ensure my operator has set up the OpenAI API key correctly."
         elif e.status_code == 429: # Rate limit
-            return "My thoughts are racing, but I'm being asked to slow down. Please give me a moment before asking again."
+            yield "My thoughts are racing, but I'm being asked to slow down. Please give me a moment before asking again."
         elif e.status_code == 400: # Bad request, e.g., prompt too long
-            return "My internal processing is encountering a complex input I cannot fully parse. Could you rephrase or simplify?"
+            yield "My internal processing is encountering a complex input I cannot fully parse. Could you rephrase or simplify?"
         else:
-            return f"I seem to have encountered a temporary disruption in my thought process (API Error: {e.status_code}). Please try again shortly."
+            yield f"I seem to have encountered a temporary disruption in my thought process (API Error: {e.status_code}). Please try again shortly."
     except Exception as e:
         logger.error(f"An unexpected error occurred in generate_persona_response: {e}")
-        return f"I seem to have encountered an unexpected error in my thoughts: {e}"
\ No newline at end of file
+        yield f"I seem to have encountered an unexpected error in my thoughts: {e}"
\ No newline at end of file
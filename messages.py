@@ -0,0 +1,40 @@
+from dataclasses import dataclass
+from pathlib import Path
+import orjson
+
+# In-memory history cap: past this, the oldest messages are moved to disk in batches
+HISTORY_CAP = 5000
+SPILL_BATCH = 500
+SESSIONS_DIR = Path.home() / ".shaimind" / "sessions"
+
+@dataclass(slots=True)
+class Msg:
+    """A single chat message. Slotted so long conversation histories stay compact in session memory."""
+    role: str
+    content: str
+
+def to_openai_messages(messages):
+    """Convert Msg objects into the list-of-dicts format expected by the OpenAI chat API."""
+    return [{"role": message.role, "content": message.content} for message in messages]
+
+def spill_history(history, session_id: str, already_spilled: int = 0,
+                  cap: int = HISTORY_CAP, batch: int = SPILL_BATCH, sessions_dir: Path = SESSIONS_DIR) -> int:
+    """
+    Keep `history` bounded: once it holds more than `cap` messages, append the oldest `batch` messages
+    (after the system prompt) to `<sessions_dir>/<session_id>.jsonl` and replace them, in place, with a single
+    "[N earlier messages truncated]" system marker at index 1. `already_spilled` is the count from earlier
+    calls for this history, whose marker is then replaced. Returns the new total number of spilled messages.
+    The file is written before `history` is touched, so an OSError leaves the history intact.
+    """
+    if len(history) <= cap:
+        return already_spilled
+    start = 2 if already_spilled else 1 # Skip the system prompt and any existing truncation marker
+    spilled = history[start:start + batch]
+
+    sessions_dir.mkdir(parents=True, exist_ok=True)
+    with open(sessions_dir / f"{session_id}.jsonl", "ab") as f:
+        f.write(b"".join(orjson.dumps(message) + b"\n" for message in spilled))
+
+    total_spilled = already_spilled + len(spilled)
+    history[1:start + batch] = [Msg("system", f"[{total_spilled} earlier messages truncated]")]
+    return total_spilled
@@ -1,5 +1,33 @@
-import json
 import os
+from pathlib import Path
+import orjson
+
+# Prompt templates: single-brace fields are filled once per persona at load time,
+# double-brace fields stay as placeholders for str.format_map later (the emotional state
+# whenever it changes, the user's message on every request).
+# The reasoning instructions are fully static so they can live in the system prompt, keeping the
+# prompt prefix identical across turns (eligible for OpenAI prompt caching); the emotional state,
+# which changes between turns, travels with the user message instead.
+INTERNAL_REASONING_TEMPLATE = """
+        INTERNAL THOUGHT PROCESS (not shown to user):
+        You are {name}. Think as they would, step by step:
+        - Interpret the user's message.
+        - Reflect on your current emotional state, given alongside each user message.
+        - Incorporate these anchors: {anchors}.
+        - Consider your reasoning style: {reasoning_style}.
+        - Formulate a brief, persona-appropriate response.
+        - Your final output should be ONLY the persona's response, without internal thoughts or extra text.
+        - Respond in plain text only, no markdown code fences, no 'RESPONSE:' prefix.
+        """
+USER_PROMPT_TEMPLATE = """
+        CURRENT EMOTIONAL STATE: {{emotional_state}} (Intensity: {{emotional_intensity}})
+        USER MESSAGE: {{user_input}}
+        Respond as {name}, considering your thought process and reasoning style.
+        """
+
+def _escape_braces(text: str) -> str:
+    """Escape braces so persona text survives a later str.format_map pass unchanged."""
+    return text.replace("{", "{{").replace("}", "}}")
 
 class PersonalityState:
     def __init__(
@@ -23,20 +51,53 @@ class PersonalityState:
         self.emotional_intensity = emotional_intensity
         self.reasoning_style = reasoning_style
         self.anchors = anchors
-        self.system_prompt = system_prompt
+        self.base_system_prompt = system_prompt # As written in the identity file
         self.preferred_topics = preferred_topics or []
         self.avoided_topics = avoided_topics or []
         self.writing_style = writing_style or {}
         self.behavioral_guidelines = behavioral_guidelines or []
         self.historical_context = historical_context or {}
+        self.prepare_prompt_templates()
+
+    def prepare_prompt_templates(self):
+        """
+        Pre-render the static persona fields (name, anchors, reasoning style): the internal reasoning
+        instructions are appended to the base prompt to form `system_prompt`, and the user prompt template
+        keeps only the per-request placeholders. Call again if those fields are changed.
+        """
+        self.anchors_text = ", ".join(self.anchors)
+        internal_reasoning_prompt = INTERNAL_REASONING_TEMPLATE.format(
+            name=self.name,
+            anchors=self.anchors_text,
+            reasoning_style=self.reasoning_style
+        )
+        self.system_prompt = self.base_system_prompt + "\n" + internal_reasoning_prompt
+        # The name goes through two more format_map passes (emotion, then user input), so it is escaped twice
+        self.user_prompt_template = USER_PROMPT_TEMPLATE.format(name=_escape_braces(_escape_braces(self.name)))
+        self._cached_emotion_key = None # (emotional_state, emotional_intensity) the cached template was built for
+        self._cached_user_prompt_template = None
+
+    def emotion_user_prompt_template(self) -> str:
+        """
+        Return the user prompt template with the current emotional state filled in, leaving only {user_input}.
+        The emotion only changes on some turns, so the result is cached and rebuilt only when it does.
+        """
+        emotion_key = (self.emotional_state, self.emotional_intensity)
+        if emotion_key != self._cached_emotion_key:
+            self._cached_user_prompt_template = self.user_prompt_template.format_map({
+                "emotional_state": _escape_braces(str(self.emotional_state)),
+                "emotional_intensity": self.emotional_intensity,
+                "user_input": "{user_input}" # Left as a placeholder for the per-call substitution
+            })
+            self._cached_emotion_key = emotion_key
+        return self._cached_user_prompt_template
 
 def load_personality(personality_path: str) -> PersonalityState:
     """Load a personality from a JSON file."""
     if not os.path.exists(personality_path):
         raise FileNotFoundError(f"Personality file not found: {personality_path}")
 
-    with open(personality_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    data = orjson.loads(Path(personality_path).read_bytes())
 
     return PersonalityState(
         name=data["name"],
@@ -0,0 +1,132 @@
+"""
+Prewarm the semantic response cache with replies generated through the OpenAI Batch API
+(half the price of live calls, completed within 24h). Not part of the Streamlit hot path.
+
+    python scripts/prewarm_cache.py submit     # build and submit the batch for every persona
+    python scripts/prewarm_cache.py collect    # once the batch has completed, write the cache seed
+
+The app loads the seed (semantic_cache.SEED_PATH) into its semantic cache on startup.
+Requires OPENAI_API_KEY in the environment.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+from pathlib import Path
+
+import openai
+
+# Make the app modules importable when run from the repository root or from scripts/
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from llm_handler import build_chat_request
+from messages import Msg
+from personality_manager import load_personality
+from semantic_cache import EMBEDDING_MODEL, SEED_PATH, SemanticCache, mood_key, normalize_embeddings
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+IDENTITIES_FOLDER = REPO_ROOT / "identities"
+WORK_DIR = Path.home() / ".shaimind" / "prewarm" # Batch input, manifest and batch id live here between runs
+
+# Opening messages users commonly send to any persona; each persona's preferred topics are added too
+COMMON_PROMPTS = [
+    "Hello!",
+    "Who are you?",
+    "Tell me about yourself.",
+    "What are you working on these days?",
+    "What inspires you?",
+    "What do you fear most?",
+    "What is your greatest achievement?",
+    "Do you have any advice for me?"
+]
+
+def load_personalities():
+    """Load every personality in the identities folder, keyed by file name."""
+    return {
+        filename.removesuffix(".json"): load_personality(str(IDENTITIES_FOLDER / filename))
+        for filename in sorted(os.listdir(IDENTITIES_FOLDER))
+        if filename.endswith(".json")
+    }
+
+def prompts_for(personality_state):
+    """Common openers plus one question per preferred topic."""
+    return COMMON_PROMPTS + [f"Tell me about {topic}." for topic in personality_state.preferred_topics]
+
+def submit(client):
+    """Write the batch input file for all personas, upload it and start the batch."""
+    WORK_DIR.mkdir(parents=True, exist_ok=True)
+    manifest = {}
+    with open(WORK_DIR / "batch_input.jsonl", "w", encoding="utf-8") as f:
+        for persona_key, personality_state in load_personalities().items():
+            for i, prompt in enumerate(prompts_for(personality_state)):
+                custom_id = f"{persona_key}-{i}"
+                # A first turn: the history is just the system prompt and the user's message, as in the app
+                history = [Msg("system", personality_state.system_prompt), Msg("user", prompt)]
+                body = build_chat_request(personality_state, prompt, history)
+                f.write(json.dumps({"custom_id": custom_id, "method": "POST", "url": "/v1/chat/completions", "body": body}) + "\n")
+                # Replies are generated in the persona's starting mood, so that is the cache key they are seeded under
+                manifest[custom_id] = {"cache_key": list(mood_key(personality_state)), "prompt": prompt}
+    (WORK_DIR / "manifest.json").write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+
+    with open(WORK_DIR / "batch_input.jsonl", "rb") as f:
+        input_file = client.files.create(file=f, purpose="batch")
+    batch = client.batches.create(
+        input_file_id=input_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h"
+    )
+    (WORK_DIR / "batch_id.txt").write_text(batch.id, encoding="utf-8")
+    logger.info(f"Submitted batch {batch.id} with {len(manifest)} requests. Run 'collect' once it has completed.")
+
+def collect(client, batch_id=None):
+    """Download a completed batch, embed its prompts and merge the replies into the cache seed file."""
+    batch_id = batch_id or (WORK_DIR / "batch_id.txt").read_text(encoding="utf-8").strip()
+    batch = client.batches.retrieve(batch_id)
+    if batch.status != "completed":
+        logger.error(f"Batch {batch_id} is '{batch.status}', not completed yet.")
+        return 1
+
+    manifest = json.loads((WORK_DIR / "manifest.json").read_text(encoding="utf-8"))
+    results = {} # mood_key -> list of (prompt, response)
+    for line in client.files.content(batch.output_file_id).text.splitlines():
+        record = json.loads(line)
+        if record.get("error") or record["response"]["status_code"] != 200:
+            logger.warning(f"Skipping failed request {record['custom_id']}")
+            continue
+        entry = manifest[record["custom_id"]]
+        response_text = record["response"]["body"]["choices"][0]["message"]["content"].strip()
+        results.setdefault(tuple(entry["cache_key"]), []).append((entry["prompt"], response_text))
+
+    cache = SemanticCache()
+    if SEED_PATH.exists():
+        cache.load(SEED_PATH)
+    for cache_key, pairs in results.items():
+        prompts = [prompt for prompt, _ in pairs]
+        embeddings = client.embeddings.create(model=EMBEDDING_MODEL, input=prompts)
+        vectors = normalize_embeddings([item.embedding for item in embeddings.data])
+        # With no earlier assistant turn, the app's context text is the prompt itself
+        cache.extend(cache_key, vectors, vectors, [response for _, response in pairs])
+    cache.save(SEED_PATH)
+    logger.info(f"Saved {sum(len(pairs) for pairs in results.values())} prewarmed responses to {SEED_PATH}")
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("submit", help="Build and submit the batch of persona prompts")
+    collect_parser = subparsers.add_parser("collect", help="Load a completed batch into the cache seed")
+    collect_parser.add_argument("--batch-id", help="Defaults to the batch submitted last")
+    args = parser.parse_args()
+
+    client = openai.OpenAI() # Reads OPENAI_API_KEY from the environment
+    if args.command == "submit":
+        submit(client)
+        return 0
+    return collect(client, args.batch_id)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+import logging
+import threading
+from pathlib import Path
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = "text-embedding-3-small" # Cheap embedding model, plenty for near-duplicate detection
+SIMILARITY_THRESHOLD = 0.92 # Minimum cosine similarity for a cached response to be reused
+SEED_PATH = Path.home() / ".shaimind" / "semantic_cache_seed.npz" # Written by scripts/prewarm_cache.py
+
+def normalize_embeddings(embeddings):
+    """Stack raw embedding vectors into a float32 matrix with L2-normalised rows."""
+    vectors = np.array(embeddings, dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+async def embed_query(openai_client, user_input, last_turn=""):
+    """
+    Embed the user's message on its own and together with the previous assistant turn,
+    in a single embeddings request. Returns two L2-normalised float32 vectors (query, context).
+    """
+    context_text = f"{last_turn}\n{user_input}" if last_turn else user_input
+    response = await openai_client.embeddings.create(model=EMBEDDING_MODEL, input=[user_input, context_text])
+    vectors = normalize_embeddings([item.embedding for item in response.data])
+    return vectors[0], vectors[1]
+
+def mood_key(personality_state):
+    """
+    Cache partition for a persona in its current mood. The mood is part of the prompt, so a reply
+    written in one mood must not be replayed in another.
+    """
+    return (personality_state.name, personality_state.emotional_state, personality_state.emotional_intensity)
+
+class SemanticCache:
+    """
+    Response cache matched by embedding similarity rather than exact text, so paraphrases
+    ("Tell me about death" / "Speak of death") can reuse an earlier reply.
+    Lookups are two-tier: candidates are first filtered by similarity of the bare query,
+    then verified against the query-plus-last-turn embedding so the same words asked in a
+    different conversational context do not hit. Entries are partitioned by mood_key(), i.e.
+    (persona name, emotional state, emotional intensity).
+    """
+    def __init__(self, threshold: float = SIMILARITY_THRESHOLD, max_entries: int = 2048):
+        self.threshold = threshold
+        self.max_entries = max_entries # Per key; oldest entries are dropped first
+        self._query_vectors = {}   # key -> (n, dim) float32 matrix of normalised query embeddings
+        self._context_vectors = {} # key -> (n, dim) float32 matrix of normalised context embeddings
+        self._responses = {}       # key -> list of n cached responses
+        self._lock = threading.Lock()
+
+    def lookup(self, key: tuple, query_vector, context_vector):
+        """Return the best cached response under `key` passing both similarity tiers, or None."""
+        with self._lock:
+            query_matrix = self._query_vectors.get(key)
+            if query_matrix is None:
+                return None
+            # Rows and vectors are normalised, so the dot product is the cosine similarity
+            candidates = np.flatnonzero(query_matrix @ query_vector >= self.threshold)
+            if candidates.size == 0:
+                return None
+            context_scores = self._context_vectors[key][candidates] @ context_vector
+            best = int(np.argmax(context_scores))
+            if context_scores[best] < self.threshold:
+                return None
+            return self._responses[key][candidates[best]]
+
+    def add(self, key: tuple, query_vector, context_vector, response: str):
+        """Store a response under its query and context embeddings."""
+        self.extend(key, query_vector[np.newaxis, :], context_vector[np.newaxis, :], [response])
+
+    def extend(self, key: tuple, query_vectors, context_vectors, responses):
+        """Store several responses at once; vectors are (n, dim) matrices of normalised embeddings."""
+        with self._lock:
+            if key in self._query_vectors:
+                query_vectors = np.vstack([self._query_vectors[key], query_vectors])
+                context_vectors = np.vstack([self._context_vectors[key], context_vectors])
+                responses = self._responses[key] + list(responses)
+            self._query_vectors[key] = query_vectors[-self.max_entries:]
+            self._context_vectors[key] = context_vectors[-self.max_entries:]
+            self._responses[key] = list(responses)[-self.max_entries:]
+
+    def save(self, path=SEED_PATH):
+        """Write all entries to an .npz file (no pickling: strings are stored as unicode arrays)."""
+        with self._lock:
+            keys = list(self._query_vectors)
+            arrays = {
+                "personas": np.array([name for name, _, _ in keys], dtype=str),
+                "emotional_states": np.array([state for _, state, _ in keys], dtype=str),
+                "emotional_intensities": np.array([intensity for _, _, intensity in keys], dtype=np.int64)
+            }
+            for i, key in enumerate(keys):
+                arrays[f"query_{i}"] = self._query_vectors[key]
+                arrays[f"context_{i}"] = self._context_vectors[key]
+                arrays[f"responses_{i}"] = np.array(self._responses[key], dtype=str)
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez(path, **arrays)
+
+    def load(self, path=SEED_PATH):
+        """Merge entries previously written by save() into this cache."""
+        with np.load(path) as data:
+            keys = zip(data["personas"].tolist(), data["emotional_states"].tolist(), data["emotional_intensities"].tolist())
+            for i, key in enumerate(keys):
+                self.extend(key, data[f"query_{i}"], data[f"context_{i}"], data[f"responses_{i}"].tolist())